@@ -1,21 +1,83 @@
+import asyncio
 import json
+import os
+import random
 import re
 import time
 import urllib.parse
 import sys
 import argparse
+import atexit
+import contextlib
 import csv
 import logging
+import logging.handlers
+import queue
+import sqlite3
+import threading
+from collections import defaultdict
+from concurrent.futures import ThreadPoolExecutor
 from pathlib import Path
+import httpx
+import numpy as np
+import orjson
 from selenium import webdriver
 from selenium.webdriver.chrome.options import Options
 from selenium.webdriver.chrome.service import Service
+from selenium.webdriver.support.ui import WebDriverWait
 from webdriver_manager.chrome import ChromeDriverManager
-from selenium.common.exceptions import TimeoutException, WebDriverException
+from selenium.common.exceptions import (
+    InvalidSessionIdException, TimeoutException, WebDriverException
+)
 from tqdm import tqdm
 
+# Maximum time to wait for Google Maps to redirect to a coordinate-bearing URL
+PAGE_WAIT_TIMEOUT = 8
+
+# Cached chromedriver path, reused across runs until it is older than a day
+DRIVER_PATH_CACHE = Path.home() / '.cache' / 'gmaps-extractor' / 'chromedriver'
+DRIVER_PATH_MAX_AGE = 24 * 60 * 60
+
+# Clear a browser's cookies after this many entries to keep long runs fast
+COOKIE_RESET_INTERVAL = 25
+
+# Upper bound for a single retry backoff, in seconds
+MAX_RETRY_DELAY = 60
+
+# Minimum number of seconds between checkpoint saves of the input file
+CHECKPOINT_INTERVAL = 30
+
+# Cross-run cache of resolved URLs and how long its entries stay valid
+CACHE_FILE = '.gmaps_cache.sqlite'
+CACHE_TTL_DAYS = 30
+
+# User agent to reduce bot detection (shared by the browser and the HTTP client)
+USER_AGENT = "Mozilla/5.0 (Macintosh; Intel Mac OS X 10_15_7) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/120.0.0.0 Safari/537.36"
+
+# Decimal places kept for coordinates; Google is only precise to ~1 cm (7 decimals)
+COORDINATE_PRECISION = 7
+
+# Precompiled URL patterns (see extract_coordinates_from_url).
+# Pin, query and viewport coordinates are found in a single scan of the URL.
+_COORDS_RE = re.compile(
+    r'(?:!3d(?P<pin_lat>-?\d+\.?\d*)!4d(?P<pin_long>-?\d+\.?\d*))'
+    r'|(?:[?&](?:q|ll)=(?P<query_lat>-?\d+\.?\d*),(?P<query_long>-?\d+\.?\d*))'
+    r'|(?:@(?P<viewport_lat>-?\d+\.?\d*),(?P<viewport_long>-?\d+\.?\d*))'
+)
+_LAT_RE = re.compile(r'!3d(-?\d+\.?\d*)')
+_LONG_RE = re.compile(r'!2d(-?\d+\.?\d*)')
+# Numeric coordinate strings as produced by extract_coordinates_from_url
+_NUM_RE = re.compile(r'-?\d+(?:\.\d*)?')
+# Any URL that is worth extracting from (or a CAPTCHA page)
+_READY_URL_RE = re.compile(r'!3d-?\d|[?&](?:q|ll)=-?\d|@-?\d')
+
 def setup_logging(log_level, log_file=None):
-    """Setup logging configuration."""
+    """
+    Setup logging configuration.
+    Records are queued and written by a background listener thread, so
+    worker threads never block on console or file I/O.
+    Returns the started QueueListener; call stop() to flush it.
+    """
     numeric_level = getattr(logging, log_level.upper(), None)
     if not isinstance(numeric_level, int):
         raise ValueError(f'Invalid log level: {log_level}')
@@ -23,51 +85,74 @@ def setup_logging(log_level, log_file=None):
     # Create formatters
     formatter = logging.Formatter('%(asctime)s - %(levelname)s - %(message)s')
     
-    # Setup root logger
-    logger = logging.getLogger()
-    logger.setLevel(numeric_level)
-    
     # Console handler
     console_handler = logging.StreamHandler()
     console_handler.setLevel(numeric_level)
     console_handler.setFormatter(formatter)
-    logger.addHandler(console_handler)
+    handlers = [console_handler]
     
     # File handler (if specified)
     if log_file:
         file_handler = logging.FileHandler(log_file)
         file_handler.setLevel(numeric_level)
         file_handler.setFormatter(formatter)
-        logger.addHandler(file_handler)
+        handlers.append(file_handler)
+    
+    # Setup root logger; it only enqueues records
+    log_queue = queue.Queue(-1)
+    logger = logging.getLogger()
+    logger.setLevel(numeric_level)
+    logger.addHandler(logging.handlers.QueueHandler(log_queue))
     
-    return logger
+    listener = logging.handlers.QueueListener(log_queue, *handlers, respect_handler_level=True)
+    listener.start()
+    return listener
+
+def _normalize_coordinate(value):
+    """Round a coordinate string to COORDINATE_PRECISION decimals, trimming trailing zeros."""
+    text = f"{float(value):.{COORDINATE_PRECISION}f}".rstrip('0').rstrip('.')
+    return '0' if text == '-0' else text
 
 def extract_coordinates_from_url(url):
     """
     Extracts latitude and longitude from a Google Maps URL.
     Returns (lat, long, source) where source indicates extraction method.
+    Coordinates are returned as normalized strings (see _normalize_coordinate).
     """
-    # Pattern 1: !3d-7.9!4d112.6 (Protobuf) - Prioritize this! (Pin location)
-    match = re.search(r'!3d(-?\d+\.?\d*)!4d(-?\d+\.?\d*)', url)
-    if match: 
-        return match.group(1), match.group(2), 'pin'
+    # Cheap substring checks let most URLs skip the regex engine entirely
+    has_pin = '!3d' in url
+    
+    query_match = None
+    viewport_match = None
+    if has_pin or '@' in url or 'q=' in url or 'll=' in url:
+        for match in _COORDS_RE.finditer(url):
+            # Pattern 1: !3d-7.9!4d112.6 (Protobuf) - Prioritize this! (Pin location)
+            if match.group('pin_lat') is not None:
+                return (_normalize_coordinate(match.group('pin_lat')),
+                        _normalize_coordinate(match.group('pin_long')), 'pin')
+            if query_match is None and match.group('query_lat') is not None:
+                query_match = match
+            elif viewport_match is None and match.group('viewport_lat') is not None:
+                viewport_match = match
     
     # Pattern 2: !2d... (Long)!3d... (Lat)
     # Note: !3d is Lat, !2d is Long
-    match_lat = re.search(r'!3d(-?\d+\.?\d*)', url)
-    match_long = re.search(r'!2d(-?\d+\.?\d*)', url)
-    if match_lat and match_long:
-        return match_lat.group(1), match_long.group(1), 'pin'
+    if has_pin and '!2d' in url:
+        match_lat = _LAT_RE.search(url)
+        match_long = _LONG_RE.search(url)
+        if match_lat and match_long:
+            return (_normalize_coordinate(match_lat.group(1)),
+                    _normalize_coordinate(match_long.group(1)), 'pin')
 
     # Pattern 3: query param ?q=lat,long or &ll=lat,long
-    match = re.search(r'[?&](?:q|ll)=(-?\d+\.?\d*),(-?\d+\.?\d*)', url)
-    if match: 
-        return match.group(1), match.group(2), 'query'
+    if query_match: 
+        return (_normalize_coordinate(query_match.group('query_lat')),
+                _normalize_coordinate(query_match.group('query_long')), 'query')
             
     # Pattern 4: @lat,long (Viewport center - Fallback)
-    match = re.search(r'@(-?\d+\.?\d*),(-?\d+\.?\d*)', url)
-    if match: 
-        return match.group(1), match.group(2), 'viewport'
+    if viewport_match: 
+        return (_normalize_coordinate(viewport_match.group('viewport_lat')),
+                _normalize_coordinate(viewport_match.group('viewport_long')), 'viewport')
         
     return None, None, None
 
@@ -76,140 +161,458 @@ def validate_coordinates(lat, long):
     Validate that coordinates are within valid ranges.
     Returns (is_valid, warnings)
     """
+    lat, long = str(lat), str(long)
+    if not _NUM_RE.fullmatch(lat) or not _NUM_RE.fullmatch(long):
+        return False, [f"Invalid coordinate format: lat={lat}, long={long}"]
+    
+    lat_float = float(lat)
+    long_float = float(long)
+    
+    # Fast path for the common case of valid, non-(0,0) coordinates
+    if (-90.0 <= lat_float <= 90.0 and -180.0 <= long_float <= 180.0
+            and (lat_float != 0 or long_float != 0)):
+        return True, []
+    
     warnings = []
-    is_valid = True
     
+    # Check latitude range
+    if lat_float < -90 or lat_float > 90:
+        warnings.append(f"Latitude {lat} out of range [-90, 90]")
+    
+    # Check longitude range
+    if long_float < -180 or long_float > 180:
+        warnings.append(f"Longitude {long} out of range [-180, 180]")
+    
+    # Check for suspicious coordinates
+    if lat_float == 0 and long_float == 0:
+        warnings.append("Coordinates are (0,0) - likely invalid")
+    
+    return False, warnings
+
+def _parse_coordinate(value):
+    """Parse a coordinate string, returning NaN if it is malformed."""
+    value = str(value)
+    return float(value) if _NUM_RE.fullmatch(value) else np.nan
+
+def _parse_coordinate_column(values):
+    """
+    Parse a sequence of coordinate strings into a float64 array (NaN if malformed).
+    Each value goes through _parse_coordinate, so the accepted format is exactly
+    the one validate_coordinates checks.
+    """
+    values = list(values)
+    return np.fromiter((_parse_coordinate(v) for v in values), dtype=np.float64, count=len(values))
+
+def validate_coordinates_bulk(pairs):
+    """
+    Validate many (lat, long) pairs in one vectorized NumPy pass.
+    Applies the same checks as validate_coordinates.
+    Returns a boolean array that is True where a pair is invalid.
+    """
+    lat = _parse_coordinate_column(p[0] for p in pairs)
+    long = _parse_coordinate_column(p[1] for p in pairs)
+    
+    return (np.isnan(lat) | np.isnan(long)
+            | (lat < -90) | (lat > 90)
+            | (long < -180) | (long > 180)
+            | ((lat == 0) & (long == 0)))
+
+def clean_gmaps_url(url):
+    """Clean URL (remove trailing dots common in copy-paste errors)."""
+    if url.endswith('.'):
+        return url[:-1]
+    return url
+
+async def resolve_async(client, semaphore, url):
+    """
+    Follow the HTTP redirect chain of a URL without a browser.
+    Returns the final URL, or None if the request failed or was not
+    redirected (the input URL itself has already been inspected).
+    """
+    async with semaphore:
+        try:
+            response = await client.head(url)
+        except (httpx.HTTPError, httpx.InvalidURL) as e:
+            # Malformed URLs raise InvalidURL, which is not an HTTPError
+            logging.debug(f"HTTP resolve failed for {url}: {e}")
+            return None
+    if not response.history:
+        return None
+    return str(response.url)
+
+async def bulk_resolve(urls, concurrency=50):
+    """
+    Resolve many URLs concurrently over HTTP.
+    Returns a dict mapping each input URL to its final URL (or None).
+    """
+    semaphore = asyncio.Semaphore(concurrency)
+    async with httpx.AsyncClient(http2=True, follow_redirects=True,
+                                 headers={'User-Agent': USER_AGENT},
+                                 timeout=PAGE_WAIT_TIMEOUT) as client:
+        results = await asyncio.gather(*(resolve_async(client, semaphore, url) for url in urls))
+    return dict(zip(urls, results))
+
+def _is_ready_url(url):
+    """
+    Check whether a URL carries extractable coordinates or is a CAPTCHA page.
+    Intermediate redirects such as /maps?q=Place+Name&ftid=... are not ready.
+    """
+    if "google.com/sorry" in url:
+        return True
+    return bool(_READY_URL_RE.search(url)) and extract_coordinates_from_url(url)[0] is not None
+
+def clear_redirect_log(driver):
+    """Discard buffered performance log entries before a new navigation."""
     try:
-        lat_float = float(lat)
-        long_float = float(long)
-        
-        # Check latitude range
-        if lat_float < -90 or lat_float > 90:
-            warnings.append(f"Latitude {lat} out of range [-90, 90]")
-            is_valid = False
-        
-        # Check longitude range
-        if long_float < -180 or long_float > 180:
-            warnings.append(f"Longitude {long} out of range [-180, 180]")
-            is_valid = False
+        driver.get_log('performance')
+    except WebDriverException:
+        pass
+
+def find_redirect_target(driver, requested_url):
+    """
+    Look through the CDP performance log for a document request whose URL
+    carries coordinates. Google's redirect target shows up here as soon as
+    the redirect response arrives, long before the page has rendered.
+    The navigation to requested_url itself is ignored unless it is the
+    target of a redirect.
+    
+    Returns the URL, or None if no such request has been sent yet.
+    """
+    try:
+        entries = driver.get_log('performance')
+    except WebDriverException:
+        return None
+    
+    for entry in entries:
+        message = json.loads(entry['message']).get('message', {})
+        if message.get('method') != 'Network.requestWillBeSent':
+            continue
+        params = message.get('params', {})
+        if params.get('type') != 'Document':
+            continue
+        url = params.get('request', {}).get('url', '')
+        if url == requested_url and 'redirectResponse' not in params:
+            continue
+        if _is_ready_url(url):
+            return url
+    return None
+
+def wait_for_coordinates_url(driver, requested_url, previous_url=None, timeout=PAGE_WAIT_TIMEOUT):
+    """
+    Wait until the browser URL contains coordinates (or a CAPTCHA page).
+    Pages are loaded with pageLoadStrategy 'none', so we poll the URL instead
+    of sleeping for a fixed amount of time. The URL of the previously loaded
+    page is ignored so a stale result is never picked up, and so is the
+    requested URL, so we wait for Google's redirect away from it.
+    
+    Redirect targets are taken from the performance log when available, in
+    which case the rest of the page load is aborted.
+    
+    Returns the resolved URL once ready, or the current URL after timeout.
+    """
+    def is_ready(d):
+        target = find_redirect_target(d, requested_url)
+        if target:
+            try:
+                d.execute_cdp_cmd('Page.stopLoading', {})
+            except WebDriverException as e:
+                logging.debug(f"Could not stop page load: {e}")
+            return target
         
-        # Check for suspicious coordinates
-        if lat_float == 0 and long_float == 0:
-            warnings.append("Coordinates are (0,0) - likely invalid")
-            is_valid = False
-            
-    except (ValueError, TypeError):
-        warnings.append(f"Invalid coordinate format: lat={lat}, long={long}")
-        is_valid = False
+        url = d.current_url
+        if url == previous_url or url == requested_url:
+            return False
+        return url if _is_ready_url(url) else False
     
-    return is_valid, warnings
+    try:
+        return WebDriverWait(driver, timeout).until(is_ready)
+    except TimeoutException:
+        logging.debug(f"Timed out waiting for coordinates in URL after {timeout}s")
+        time.sleep(0.5)
+    return driver.current_url
 
-def get_coordinates(driver, gmaps_url, name, context=None, max_retries=3, retry_delay=5):
+def is_retryable_error(error):
     """
-    Attempts to get coordinates first by visiting the URL, 
-    and failing that (or if URL is blocked/broken), by searching the name.
+    Check whether a WebDriver error is transient (timeouts and network failures).
+    Anything else will fail the same way again, so retrying only wastes time.
+    """
+    if isinstance(error, TimeoutException):
+        return True
+    message = str(error).lower()
+    return 'net::err_' in message or 'timed out' in message or 'timeout' in message
+
+def backoff_delay(retry_delay, attempt):
+    """Exponential backoff with +/-20% jitter, capped at MAX_RETRY_DELAY seconds."""
+    return min(MAX_RETRY_DELAY, retry_delay * (2 ** attempt) * random.uniform(0.8, 1.2))
+
+def extract_from_input_url(gmaps_url, prefer_pin=False):
+    """
+    Extracts coordinates already embedded in an input URL, so no request is needed.
+    Viewport coordinates are only the map center; with prefer_pin they are
+    ignored so the URL is resolved to the actual pin instead.
+    
+    Returns: (lat, long, source) or (None, None, None)
+    """
+    lat, long, source = extract_coordinates_from_url(gmaps_url)
+    if lat and long and (source != 'viewport' or not prefer_pin):
+        return lat, long, source
+    return None, None, None
+
+def visit_url(driver, gmaps_url, max_retries=3, retry_delay=5, prefer_pin=False):
+    """
+    Strategy 1: gets coordinates by visiting the URL and reading where Google redirects.
     Implements retry logic with exponential backoff.
     
     Returns: (lat, long, source) or (None, None, None)
     """
-    lat, long, source = None, None, None
+    if not gmaps_url or len(gmaps_url) <= 5:
+        return None, None, None
     
-    # Strategy 1: Direct URL Visit
-    if gmaps_url and len(gmaps_url) > 5:
-        # Clean URL (remove trailing dots common in copy-paste errors)
-        if gmaps_url.endswith('.'):
-             gmaps_url = gmaps_url[:-1]
-             
-        for attempt in range(max_retries):
-            try:
-                logging.debug(f"Visiting URL (attempt {attempt + 1}/{max_retries}): {gmaps_url}")
-                driver.get(gmaps_url)
-                # Wait for potential redirects
-                time.sleep(4) 
-                final_url = driver.current_url
-                
-                # Check for soft-block (Google Sorry/CAPTCHA)
-                if "google.com/sorry" in final_url:
-                    logging.warning("Detected Google CAPTCHA/Soft-block on URL")
-                    lat, long, source = None, None, None
-                else:
-                    lat, long, source = extract_coordinates_from_url(final_url)
-                    if lat and long:
-                        logging.info(f"Extracted from URL: {lat}, {long} (source: {source})")
-                        return lat, long, source
-                
-                # If we got here without success, break retry loop for URL
-                break
-                        
-            except Exception as e:
-                logging.warning(f"Error visiting URL (attempt {attempt + 1}/{max_retries}): {e}")
-                if attempt < max_retries - 1:
-                    wait_time = retry_delay * (2 ** attempt)  # Exponential backoff
-                    logging.info(f"Retrying in {wait_time} seconds...")
-                    time.sleep(wait_time)
-                else:
-                    logging.error(f"Failed after {max_retries} attempts")
+    gmaps_url = clean_gmaps_url(gmaps_url)
+    
+    # Skip the browser entirely if the URL already has coordinates
+    lat, long, source = extract_from_input_url(gmaps_url, prefer_pin)
+    if lat and long:
+        logging.info(f"Extracted from input URL: {lat}, {long} (source: {source})")
+        return lat, long, source
+         
+    for attempt in range(max_retries):
+        try:
+            logging.debug(f"Visiting URL (attempt {attempt + 1}/{max_retries}): {gmaps_url}")
+            previous_url = driver.current_url
+            clear_redirect_log(driver)
+            driver.get(gmaps_url)
+            # Wait for potential redirects
+            final_url = wait_for_coordinates_url(driver, gmaps_url, previous_url)
             
-    # Strategy 2: Search Query Fallback (if URL failed or coordinates not found)
-    if not lat or not long:
-        logging.debug(f"Fallback: Searching for '{name}'...")
-        
-        for attempt in range(max_retries):
-            try:
-                # Apply context if provided
-                search_query = name
-                if context and context not in name:
-                    search_query += f" {context}"
-                    logging.debug(f"Applied context: '{search_query}'")
-                    
-                query = urllib.parse.quote(search_query)
-                search_url = f"https://www.google.com/maps/search/{query}"
-                driver.get(search_url)
-                time.sleep(5)
-                
-                final_url = driver.current_url
+            # Check for soft-block (Google Sorry/CAPTCHA)
+            if "google.com/sorry" in final_url:
+                logging.warning("Detected Google CAPTCHA/Soft-block on URL")
+                lat, long, source = None, None, None
+            elif final_url.rstrip('/') == gmaps_url.rstrip('/'):
+                # No redirect happened; the input URL policy applies
+                lat, long, source = extract_from_input_url(final_url, prefer_pin)
+            else:
                 lat, long, source = extract_coordinates_from_url(final_url)
-                if lat and long:
-                    logging.info(f"Extracted from search: {lat}, {long} (source: {source})")
-                    return lat, long, source
-                
-                # If we got here without success, break retry loop
+            
+            if lat and long:
+                logging.info(f"Extracted from URL: {lat}, {long} (source: {source})")
+                return lat, long, source
+            
+            # If we got here without success, break retry loop for URL
+            break
+                    
+        except InvalidSessionIdException:
+            # The browser is gone; let the caller restart it
+            raise
+        except WebDriverException as e:
+            logging.warning(f"Error visiting URL (attempt {attempt + 1}/{max_retries}): {e}")
+            if not is_retryable_error(e):
                 break
-                
-            except Exception as e:
-                logging.warning(f"Error during search (attempt {attempt + 1}/{max_retries}): {e}")
-                if attempt < max_retries - 1:
-                    wait_time = retry_delay * (2 ** attempt)
-                    logging.info(f"Retrying in {wait_time} seconds...")
-                    time.sleep(wait_time)
-                else:
-                    logging.error(f"Failed after {max_retries} attempts")
-             
+            if attempt < max_retries - 1:
+                wait_time = backoff_delay(retry_delay, attempt)  # Exponential backoff
+                logging.info(f"Retrying in {wait_time:.1f} seconds...")
+                time.sleep(wait_time)
+            else:
+                logging.error(f"Failed after {max_retries} attempts")
+        except Exception as e:
+            # Not a browser/network problem; retrying would fail the same way
+            logging.warning(f"Error visiting URL: {e}")
+            break
+
     return None, None, None
 
+def search_by_name(driver, name, context=None, max_retries=3, retry_delay=5):
+    """
+    Strategy 2: gets coordinates by searching Google Maps for the name.
+    Implements retry logic with exponential backoff.
+    
+    Returns: (lat, long, source) or (None, None, None)
+    """
+    logging.debug(f"Fallback: Searching for '{name}'...")
+    
+    # Apply context if provided (built once, reused across retries)
+    search_query = name
+    if context and context not in name:
+        search_query = f"{name} {context}"
+        logging.debug(f"Applied context: '{search_query}'")
+    
+    search_url = f"https://www.google.com/maps/search/{urllib.parse.quote(search_query)}"
+    
+    for attempt in range(max_retries):
+        try:
+            previous_url = driver.current_url
+            clear_redirect_log(driver)
+            driver.get(search_url)
+            
+            final_url = wait_for_coordinates_url(driver, search_url, previous_url)
+            lat, long, source = extract_coordinates_from_url(final_url)
+            if lat and long:
+                logging.info(f"Extracted from search: {lat}, {long} (source: {source})")
+                return lat, long, source
+            
+            # If we got here without success, break retry loop
+            break
+            
+        except InvalidSessionIdException:
+            # The browser is gone; let the caller restart it
+            raise
+        except WebDriverException as e:
+            logging.warning(f"Error during search (attempt {attempt + 1}/{max_retries}): {e}")
+            if not is_retryable_error(e):
+                break
+            if attempt < max_retries - 1:
+                wait_time = backoff_delay(retry_delay, attempt)
+                logging.info(f"Retrying in {wait_time:.1f} seconds...")
+                time.sleep(wait_time)
+            else:
+                logging.error(f"Failed after {max_retries} attempts")
+        except Exception as e:
+            logging.warning(f"Error during search: {e}")
+            break
+         
+    return None, None, None
+
+def get_coordinates(driver, gmaps_url, name, context=None, max_retries=3, retry_delay=5,
+                    prefer_pin=False):
+    """
+    Attempts to get coordinates first by visiting the URL, 
+    and failing that (or if URL is blocked/broken), by searching the name.
+    
+    Returns: (lat, long, source) or (None, None, None)
+    """
+    lat, long, source = visit_url(driver, gmaps_url, max_retries, retry_delay, prefer_pin)
+    if lat and long:
+        return lat, long, source
+    
+    # Fallback (if URL failed or coordinates not found)
+    return search_by_name(driver, name, context, max_retries, retry_delay)
+
+def _csv_row(key, item):
+    """Build a CSV row for one entry."""
+    latlong = item.get('latlong') or {}
+    return (key, item.get('name', ''), item.get('gmaps', ''),
+            latlong.get('lat', ''), latlong.get('long', ''))
+
+def write_outputs(data, json_file, csv_file=None):
+    """
+    Save data to a JSON file and, optionally, a CSV file in a single pass.
+    Entries are serialized one at a time, so no second copy of the whole
+    dataset is built. Both files are written to temp files, then swapped in
+    atomically.
+    """
+    json_tmp = f"{json_file}.tmp"
+    csv_tmp = f"{csv_file}.tmp" if csv_file else None
+    
+    try:
+        with contextlib.ExitStack() as stack:
+            json_f = stack.enter_context(open(json_tmp, 'wb', buffering=1 << 20))
+            writer = None
+            if csv_tmp:
+                csv_f = stack.enter_context(
+                    open(csv_tmp, 'w', newline='', encoding='utf-8', buffering=1 << 20)
+                )
+                writer = csv.writer(csv_f)
+                # Write header
+                writer.writerow(['key', 'name', 'gmaps_url', 'latitude', 'longitude'])
+            
+            # Same layout as orjson.dumps(data, option=orjson.OPT_INDENT_2)
+            json_f.write(b'{')
+            for index, (key, item) in enumerate(data.items()):
+                json_f.write(b',\n  ' if index else b'\n  ')
+                json_f.write(orjson.dumps(key))
+                json_f.write(b': ')
+                json_f.write(orjson.dumps(item, option=orjson.OPT_INDENT_2).replace(b'\n', b'\n  '))
+                if writer:
+                    writer.writerow(_csv_row(key, item))
+            json_f.write(b'\n}' if data else b'}')
+        
+        os.replace(json_tmp, json_file)
+        logging.info(f"Saved to JSON: {json_file}")
+        if csv_file:
+            os.replace(csv_tmp, csv_file)
+            logging.info(f"Saved to CSV: {csv_file}")
+    except BaseException:
+        # Never leave partial temp files behind, including on Ctrl+C
+        for tmp in (json_tmp, csv_tmp):
+            if tmp:
+                with contextlib.suppress(OSError):
+                    os.remove(tmp)
+        raise
+
 def save_to_json(data, output_file):
     """Save data to JSON file."""
-    with open(output_file, 'w') as f:
-        json.dump(data, f, indent=4, ensure_ascii=False)
-    logging.info(f"Saved to JSON: {output_file}")
-
-def save_to_csv(data, output_file):
-    """Save data to CSV file."""
-    with open(output_file, 'w', newline='', encoding='utf-8') as f:
-        writer = csv.writer(f)
-        # Write header
-        writer.writerow(['key', 'name', 'gmaps_url', 'latitude', 'longitude'])
-        
-        # Write data
-        for key, item in data.items():
-            name = item.get('name', '')
-            gmaps = item.get('gmaps', '')
-            latlong = item.get('latlong', {})
-            lat = latlong.get('lat', '')
-            long = latlong.get('long', '')
-            writer.writerow([key, name, gmaps, lat, long])
+    write_outputs(data, output_file)
+
+_cache_lock = threading.Lock()
+
+def open_cache(cache_file):
+    """Open (creating if needed) the SQLite cache of resolved URLs."""
+    conn = sqlite3.connect(cache_file, check_same_thread=False)
+    conn.execute(
+        'CREATE TABLE IF NOT EXISTS cache('
+        'url TEXT PRIMARY KEY, lat TEXT, long TEXT, source TEXT, ts INTEGER)'
+    )
+    conn.commit()
+    return conn
+
+def cache_get(conn, url, ttl):
+    """
+    Look up cached coordinates for a URL that are at most ttl seconds old.
+    Returns: (lat, long, source) or (None, None, None)
+    """
+    with _cache_lock:
+        row = conn.execute(
+            'SELECT lat, long, source FROM cache WHERE url = ? AND ts >= ?',
+            (url, int(time.time() - ttl))
+        ).fetchone()
+    return row if row else (None, None, None)
+
+def cache_put(conn, url, lat, long, source):
+    """Store resolved coordinates for a URL."""
+    with _cache_lock:
+        conn.execute(
+            'INSERT OR REPLACE INTO cache (url, lat, long, source, ts) VALUES (?, ?, ?, ?, ?)',
+            (url, lat, long, source, int(time.time()))
+        )
+        conn.commit()
+
+_chromedriver_path = None
+_chromedriver_lock = threading.Lock()
+
+def get_chromedriver_path():
+    """
+    Return the chromedriver binary path.
+    The path is memoized for the process and cached on disk, so
+    ChromeDriverManager only runs when the cache is missing or stale.
+    """
+    global _chromedriver_path
     
-    logging.info(f"Saved to CSV: {output_file}")
+    with _chromedriver_lock:
+        if _chromedriver_path:
+            return _chromedriver_path
+        
+        try:
+            if time.time() - DRIVER_PATH_CACHE.stat().st_mtime < DRIVER_PATH_MAX_AGE:
+                cached_path = DRIVER_PATH_CACHE.read_text().strip()
+                if cached_path and Path(cached_path).exists():
+                    _chromedriver_path = cached_path
+                    return _chromedriver_path
+        except OSError:
+            pass
+        
+        _chromedriver_path = ChromeDriverManager().install()
+        try:
+            DRIVER_PATH_CACHE.parent.mkdir(parents=True, exist_ok=True)
+            DRIVER_PATH_CACHE.write_text(_chromedriver_path)
+        except OSError as e:
+            logging.debug(f"Could not cache chromedriver path: {e}")
+        return _chromedriver_path
+
+def get_driver(chrome_options):
+    """Create a headless Chrome driver with the given options."""
+    service = Service(get_chromedriver_path())
+    return webdriver.Chrome(service=service, options=chrome_options)
 
 def main():
     parser = argparse.ArgumentParser(
@@ -221,6 +624,7 @@ Examples:
   python fetch_coordinates.py places.json --force
   python fetch_coordinates.py places.json --output-format csv
   python fetch_coordinates.py places.json --context "New York"
+  python fetch_coordinates.py places.json --workers 8
   python fetch_coordinates.py places.json --log-level DEBUG --log-file app.log
         """
     )
@@ -236,6 +640,18 @@ Examples:
                        help="Maximum number of retry attempts (default: 3)")
     parser.add_argument("--retry-delay", type=int, default=5,
                        help="Initial retry delay in seconds (default: 5)")
+    parser.add_argument("--workers", type=int, default=4,
+                       help="Number of parallel browser workers (default: 4)")
+    parser.add_argument("--prefer-pin", action="store_true",
+                       help="Ignore map-center (@lat,long) coordinates in input URLs and resolve the place pin instead")
+    parser.add_argument("--cache-file", type=str, default=CACHE_FILE,
+                       help=f"SQLite cache of resolved URLs (default: {CACHE_FILE})")
+    parser.add_argument("--cache-ttl", type=float, default=CACHE_TTL_DAYS,
+                       help=f"Days before cached coordinates expire (default: {CACHE_TTL_DAYS})")
+    parser.add_argument("--no-cache", action="store_true",
+                       help="Do not read or write the URL cache")
+    parser.add_argument("--http-concurrency", type=int, default=50,
+                       help="Concurrent HTTP requests when resolving URLs without a browser; 0 disables (default: 50)")
     parser.add_argument("--log-level", choices=['DEBUG', 'INFO', 'WARNING', 'ERROR'], 
                        default='INFO', help="Logging level (default: INFO)")
     parser.add_argument("--log-file", type=str, default=None,
@@ -243,8 +659,9 @@ Examples:
     
     args = parser.parse_args()
     
-    # Setup logging
-    logger = setup_logging(args.log_level, args.log_file)
+    # Setup logging; stopped after the final save, or at exit on early returns
+    log_listener = setup_logging(args.log_level, args.log_file)
+    atexit.register(log_listener.stop)
     
     input_file = args.input_file
     force_update = args.force
@@ -252,6 +669,8 @@ Examples:
     context = args.context
     max_retries = args.max_retries
     retry_delay = args.retry_delay
+    prefer_pin = args.prefer_pin
+    cache_ttl = args.cache_ttl * 24 * 60 * 60
 
     try:
         with open(input_file, 'r') as f:
@@ -268,17 +687,28 @@ Examples:
     chrome_options.add_argument("--headless=new") 
     chrome_options.add_argument("--no-sandbox")
     chrome_options.add_argument("--disable-dev-shm-usage")
-    # User agent to reduce bot detection
-    chrome_options.add_argument("user-agent=Mozilla/5.0 (Macintosh; Intel Mac OS X 10_15_7) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/120.0.0.0 Safari/537.36")
-    
-    logging.info("Initializing Browser...")
-    service = Service(ChromeDriverManager().install())
-    driver = webdriver.Chrome(service=service, options=chrome_options)
+    # Return from driver.get() immediately; we poll the URL for redirects ourselves
+    chrome_options.set_capability('pageLoadStrategy', 'none')
+    # Record network events so redirect targets can be read without rendering the page
+    chrome_options.set_capability('goog:loggingPrefs', {'performance': 'ALL'})
+    chrome_options.add_argument("--disable-extensions")
+    chrome_options.add_argument("--disable-gpu")
+    chrome_options.add_argument("--disable-background-networking")
+    # We only read the URL, so skip downloading images, stylesheets and fonts
+    chrome_options.add_argument("--blink-settings=imagesEnabled=false")
+    chrome_options.add_experimental_option("prefs", {
+        "profile.managed_default_content_settings.images": 2,
+        "profile.managed_default_content_settings.stylesheets": 2,
+        "profile.managed_default_content_settings.fonts": 2,
+    })
+    chrome_options.add_argument(f"user-agent={USER_AGENT}")
     
     updated_count = 0
     skipped_count = 0
     failed_count = 0
     validation_warnings = 0
+    last_save = time.monotonic()
+    resolved = []  # (name, lat, long) for every resolved entry
     
     # Track timing
     import time as time_module
@@ -290,79 +720,266 @@ Examples:
     if context:
         logging.info(f"Location context: '{context}'")
     
+    # Determine which entries need processing up front so workers only see real work;
+    # their URLs are cleaned once here and reused by every pass below
+    pending = []
+    gmaps_urls = {}
+    for key, item in data.items():
+        latlong = item.get('latlong', {})
+        if force_update or not latlong.get('lat', '') or not latlong.get('long', ''):
+            pending.append((key, item))
+            gmaps_urls[key] = clean_gmaps_url(item.get('gmaps') or '')
+    
+    # Shared state between worker threads; the pool holds (driver, entries processed)
+    lock = threading.Lock()
+    stop_event = threading.Event()
+    driver_pool = queue.Queue()
+    live_drivers = 0  # drivers in the pool or borrowed by a worker
+    
+    def record_result(item, new_lat, new_long, source):
+        """Store a resolved entry. Callers in worker threads must hold the lock."""
+        nonlocal updated_count, failed_count, last_save
+        
+        name = item.get('name', 'Unknown')
+        latlong = item.get('latlong', {})
+        current_lat = latlong.get('lat', '')
+        current_long = latlong.get('long', '')
+        
+        if new_lat and new_long:
+            # Coordinates are validated in bulk once processing is done
+            resolved.append((name, new_lat, new_long))
+            
+            # Only update if changed (optional check, but good for logs)
+            if new_lat != current_lat or new_long != current_long:
+                item.setdefault('latlong', {})
+                item['latlong']['lat'] = str(new_lat)
+                item['latlong']['long'] = str(new_long)
+                logging.info(f"UPDATED '{name}': {new_lat}, {new_long} (source: {source})")
+                updated_count += 1
+                
+                # Periodic checkpoint save
+                if time.monotonic() - last_save > CHECKPOINT_INTERVAL:
+                    try:
+                        save_to_json(data, input_file)
+                    except Exception as e:
+                        # A failed checkpoint must not abort the run; the final save retries
+                        logging.warning(f"Checkpoint save failed: {e}")
+                    last_save = time.monotonic()
+            else:
+                 logging.debug(f"No change for '{name}'")
+        else:
+            logging.error(f"FAILED: Could not resolve coordinates for '{name}'")
+            failed_count += 1
+    
+    def process_entry(entries, pbar):
+        """
+        Resolve entries sharing one URL, using a driver borrowed from the pool.
+        The URL is visited once for the whole group; the name search fallback
+        runs per distinct name, since its result depends on the name.
+        """
+        nonlocal live_drivers
+        
+        if stop_event.is_set():
+            return
+        
+        key, item = entries[0]
+        name = item.get('name', 'Unknown')
+        gmaps_url = gmaps_urls[key]
+        
+        logging.debug(f"Processing: {name}")
+        
+        # Borrow a driver; give up if every browser has died and could not be restarted
+        driver, uses = None, 0
+        while driver is None:
+            with lock:
+                if live_drivers == 0:
+                    logging.error(f"No browser available for '{name}'")
+                    for entry_key, entry_item in entries:
+                        record_result(entry_item, None, None, None)
+                    pbar.update(len(entries))
+                    return
+            try:
+                driver, uses = driver_pool.get(timeout=1)
+            except queue.Empty:
+                pass
+        
+        def with_browser(strategy, *strategy_args):
+            """Run a browser strategy, restarting Chrome once if its session died."""
+            nonlocal driver, uses
+            for _ in range(2):
+                if driver is None:
+                    break
+                try:
+                    return strategy(driver, *strategy_args)
+                except InvalidSessionIdException:
+                    # Only a dead session warrants a new browser
+                    logging.warning("Browser session lost, restarting Chrome...")
+                    try:
+                        driver.quit()
+                    except WebDriverException:
+                        pass
+                    try:
+                        driver, uses = get_driver(chrome_options), 0
+                    except Exception as e:
+                        logging.error(f"Could not restart Chrome: {e}")
+                        driver = None
+            return None, None, None
+        
+        try:
+            results = {}
+            url_result = with_browser(visit_url, gmaps_url, max_retries, retry_delay, prefer_pin)
+            if url_result[0] and url_result[1]:
+                # Only results resolved by following the URL are cached under it;
+                # search results depend on the name and context, and coordinates
+                # read from the input URL itself are subject to --prefer-pin
+                if cache is not None and url_result != extract_coordinates_from_url(gmaps_urls[key]):
+                    cache_put(cache, gmaps_urls[key], *url_result)
+                for entry_key, _ in entries:
+                    results[entry_key] = url_result
+            else:
+                searches = {}
+                for entry_key, entry_item in entries:
+                    entry_name = entry_item.get('name', 'Unknown')
+                    if entry_name not in searches:
+                        searches[entry_name] = with_browser(
+                            search_by_name, entry_name, context, max_retries, retry_delay
+                        )
+                    results[entry_key] = searches[entry_name]
+            
+            uses += 1
+            if driver is not None and uses % COOKIE_RESET_INTERVAL == 0:
+                logging.debug("Clearing browser cookies")
+                try:
+                    driver.delete_all_cookies()
+                except WebDriverException as e:
+                    logging.warning(f"Could not clear browser cookies: {e}")
+        finally:
+            if driver is not None:
+                driver_pool.put((driver, uses))
+            else:
+                # A browser that could not be restarted is dropped from the pool
+                with lock:
+                    live_drivers -= 1
+        
+        with lock:
+            # Update progress bar description with current location
+            pbar.set_description(f"Processing: {name[:30]}...")
+            for entry_key, entry_item in entries:
+                record_result(entry_item, *results[entry_key])
+            pbar.update(len(entries))
+    
+    executor = None
+    cache = None
+    
     try:
-        # Use tqdm for progress bar
+        if not args.no_cache:
+            cache = open_cache(args.cache_file)
+        
+        # Use coordinates already present in input URLs or cached by earlier runs;
+        # --force bypasses the cache so every URL is resolved again
+        http_pending = []
+        for key, item in pending:
+            gmaps_url = gmaps_urls[key]
+            new_lat, new_long, source = extract_from_input_url(gmaps_url, prefer_pin)
+            if new_lat and new_long:
+                logging.info(f"Extracted from input URL: {new_lat}, {new_long} (source: {source})")
+            elif cache is not None and not force_update and len(gmaps_url) > 5:
+                new_lat, new_long, source = cache_get(cache, gmaps_url, cache_ttl)
+                if new_lat and new_long:
+                    logging.info(f"Loaded from cache: {new_lat}, {new_long} (source: {source})")
+            
+            if new_lat and new_long:
+                record_result(item, new_lat, new_long, source)
+            else:
+                http_pending.append((key, item))
+        
+        # Resolve URLs over plain HTTP next; only entries that fail need a browser
+        urls = sorted({gmaps_urls[key] for key, _ in http_pending if len(gmaps_urls[key]) > 5})
+        resolved_urls = {}
+        if urls and args.http_concurrency > 0:
+            logging.info(f"Resolving {len(urls)} URL(s) over HTTP...")
+            resolved_urls = asyncio.run(bulk_resolve(urls, args.http_concurrency))
+        
+        browser_pending = []
+        for key, item in http_pending:
+            gmaps_url = gmaps_urls[key]
+            final_url = resolved_urls.get(gmaps_url)
+            new_lat, new_long, source = None, None, None
+            if final_url and "google.com/sorry" not in final_url:
+                new_lat, new_long, source = extract_coordinates_from_url(final_url)
+            
+            if new_lat and new_long:
+                logging.info(f"Extracted from HTTP redirect: {new_lat}, {new_long} (source: {source})")
+                if cache is not None:
+                    cache_put(cache, gmaps_url, new_lat, new_long, source)
+                record_result(item, new_lat, new_long, source)
+            elif not gmaps_url and not item.get('name', 'Unknown'):
+                # Nothing to visit or search for; never worth a browser
+                logging.warning(f"SKIPPED: No Name or URL for key '{key}'")
+                skipped_count += 1
+            else:
+                browser_pending.append((key, item))
+        
+        # Group entries by URL so each distinct URL is visited only once;
+        # entries without a usable URL are searched individually
+        url_to_entries = defaultdict(list)
+        for key, item in browser_pending:
+            gmaps_url = gmaps_urls[key]
+            group_key = gmaps_url if len(gmaps_url) > 5 else (None, key)
+            url_to_entries[group_key].append((key, item))
+        browser_tasks = list(url_to_entries.values())
+        
+        num_workers = max(1, min(args.workers, len(browser_tasks)))
+        if browser_tasks:
+            logging.info(f"Initializing {num_workers} browser(s) for {len(browser_pending)} entries "
+                         f"({len(browser_tasks)} distinct)...")
+            for _ in range(num_workers):
+                driver_pool.put((get_driver(chrome_options), 0))
+                live_drivers += 1
+        
+        # Use tqdm for progress bar (entries already resolved count as done)
         with tqdm(total=len(data), desc="Processing locations", unit="location") as pbar:
-            for key, item in data.items():
-                name = item.get('name', 'Unknown')
-                gmaps_url = item.get('gmaps', '')
-                latlong = item.get('latlong', {})
-                current_lat = latlong.get('lat', '')
-                current_long = latlong.get('long', '')
-                
-                # Update progress bar description with current location
-                pbar.set_description(f"Processing: {name[:30]}...")
-                
-                # Determine whether to process this entry
-                should_process = False
-                if force_update:
-                    should_process = True
-                elif not current_lat or not current_long:
-                     should_process = True
-                
-                if should_process:
-                    logging.debug(f"Processing: {name}")
-                    
-                    # Check if we have enough info to proceed
-                    if not gmaps_url and not name:
-                        logging.warning(f"SKIPPED: No Name or URL for key '{key}'")
-                        skipped_count += 1
-                        pbar.update(1)
-                        continue
-                    
-                    new_lat, new_long, source = get_coordinates(
-                        driver, gmaps_url, name, context, max_retries, retry_delay
-                    )
-                    
-                    if new_lat and new_long:
-                        # Validate coordinates
-                        is_valid, warnings = validate_coordinates(new_lat, new_long)
-                        
-                        if warnings:
-                            validation_warnings += 1
-                            for warning in warnings:
-                                logging.warning(f"Validation warning for '{name}': {warning}")
-                        
-                        # Only update if changed (optional check, but good for logs)
-                        if new_lat != current_lat or new_long != current_long:
-                            item['latlong']['lat'] = str(new_lat)
-                            item['latlong']['long'] = str(new_long)
-                            logging.info(f"UPDATED '{name}': {new_lat}, {new_long} (source: {source})")
-                            updated_count += 1
-                            
-                            # Periodic save every 5 updates
-                            if updated_count % 5 == 0:
-                                save_to_json(data, input_file)
-                        else:
-                             logging.debug(f"No change for '{name}'")
-                    else:
-                        logging.error(f"FAILED: Could not resolve coordinates for '{name}'")
-                        failed_count += 1
-                
-                pbar.update(1)
+            pbar.update(len(data) - len(browser_pending))
+            executor = ThreadPoolExecutor(max_workers=num_workers)
+            # Consume the iterator so worker exceptions are raised here
+            for _ in executor.map(lambda entries: process_entry(entries, pbar), browser_tasks):
+                pass
                 
     except KeyboardInterrupt:
         logging.warning("\nStopping due to user interrupt...")
     finally:
-        driver.quit()
+        # Let in-flight entries finish; queued ones return immediately
+        stop_event.set()
+        if executor is not None:
+            executor.shutdown(wait=True)
+        
+        while not driver_pool.empty():
+            driver, _ = driver_pool.get_nowait()
+            try:
+                driver.quit()
+            except WebDriverException as e:
+                # A dead browser must not prevent the final save
+                logging.warning(f"Could not close Chrome: {e}")
+        
+        if cache is not None:
+            cache.close()
+        
+        # Validate all resolved coordinates at once; only failures are inspected individually
+        invalid_mask = validate_coordinates_bulk([(lat, long) for _, lat, long in resolved])
+        for index in np.flatnonzero(invalid_mask):
+            name, lat, long = resolved[index]
+            _, warnings = validate_coordinates(lat, long)
+            for warning in warnings:
+                logging.warning(f"Validation warning for '{name}': {warning}")
+        validation_warnings = int(invalid_mask.sum())
         
-        # Final save to JSON (always save source data)
-        save_to_json(data, input_file)
+        # Final save to JSON (always save source data), plus the requested output format
+        csv_file = Path(input_file).stem + '.csv' if output_format == 'csv' else None
+        write_outputs(data, input_file, csv_file)
         
-        # Save to requested output format
-        if output_format == 'csv':
-            csv_file = Path(input_file).stem + '.csv'
-            save_to_csv(data, csv_file)
+        # Flush queued log records so they appear before the summary
+        log_listener.stop()
+        atexit.unregister(log_listener.stop)
             
     # Calculate timing statistics
     end_time = time_module.time()